@@ -5,9 +5,15 @@
 import streamlit as st
 import requests
 import sqlite3
+import time
 import pandas as pd
-import uuid
+import numpy as np
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 st.set_page_config(page_title="Renal + Diabetes Clinical Platform", layout="wide")
 
@@ -15,99 +21,207 @@ USDA_API_KEY = st.secrets["USDA_API_KEY"]
 BASE_URL = "https://api.nal.usda.gov/fdc/v1"
 
 MEALS = ["Breakfast", "Lunch", "Dinner", "Snacks"]
+NUTRIENTS = ("sodium","potassium","phosphorus",
+             "carbs","protein","calories","water")
+# USDA nutrient number -> position in NUTRIENTS
+NUM_TO_IDX = {"307":0,"306":1,"305":2,"205":3,"203":4,"208":5,"255":6}
+CKD_NUTRIENTS = ("sodium","potassium","phosphorus")
+CKD_LABELS = ("Sodium","Potassium","Phosphorus")
+RISK_COLUMNS = ["ckd_risk","dm_risk","combined_risk"]
+
+# Percent-of-limit thresholds for the Low / Moderate / High risk bands
+RISK_LOW, RISK_MODERATE = 40.0, 70.0
+RISK_LABELS = ("Low","Moderate","High")
+RISK_ICONS = ("🟢","🟡","🔴")
+
+# Daily (sodium, potassium, phosphorus) limits in mg, indexed by CKD stage - 1
+STAGE_LIMITS = (
+    (2300,3500,1000),
+    (2300,3500,1000),
+    (2000,2500,900),
+    (2000,2000,800),
+    (2000,1500,700),
+)
+# 100/limit per stage, so percent-of-limit is a single multiply
+STAGE_INV_LIMITS = 100.0/np.array(STAGE_LIMITS,dtype=np.float64)
 MEAL_SPLIT = {"Breakfast":0.25,"Lunch":0.30,"Dinner":0.30,"Snacks":0.15}
 
+SQL_UPSERT_LOG = "INSERT OR REPLACE INTO logs VALUES (?,?,?,?,?,?,?,?,?,?,?,?)"
+SQL_LOAD_RANGE = (
+    "SELECT log_date, ckd_risk, dm_risk, combined_risk "
+    "FROM logs WHERE patient=? AND log_date>=? ORDER BY log_date"
+)
+
 # ==========================================================
 # DATABASE
 # ==========================================================
 
-conn = sqlite3.connect("renal_platform.db", check_same_thread=False)
-c = conn.cursor()
-
-c.execute("""
-CREATE TABLE IF NOT EXISTS logs (
-    patient TEXT,
-    log_date TEXT,
-    sodium REAL,
-    potassium REAL,
-    phosphorus REAL,
-    carbs REAL,
-    protein REAL,
-    calories REAL,
-    water REAL,
-    ckd_risk REAL,
-    dm_risk REAL,
-    combined_risk REAL,
-    PRIMARY KEY (patient, log_date)
-)
-""")
-conn.commit()
+@st.cache_resource
+def get_conn():
+    conn = sqlite3.connect("renal_platform.db", check_same_thread=False,
+                           cached_statements=256)
+    conn.executescript("""
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA cache_size=-65536;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+    """)
+    return conn
+
+@st.cache_resource
+def init_schema(_conn):
+    _conn.execute("""
+    CREATE TABLE IF NOT EXISTS logs (
+        patient TEXT,
+        log_date TEXT,
+        sodium REAL,
+        potassium REAL,
+        phosphorus REAL,
+        carbs REAL,
+        protein REAL,
+        calories REAL,
+        water REAL,
+        ckd_risk REAL,
+        dm_risk REAL,
+        combined_risk REAL,
+        PRIMARY KEY (patient, log_date)
+    )
+    """)
+    # Covering index so dashboard reads never touch the table pages
+    _conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_logs_dash
+    ON logs(patient, log_date, ckd_risk, dm_risk, combined_risk)
+    """)
+    _conn.execute("ANALYZE")
+    _conn.commit()
+
+conn = get_conn()
+init_schema(conn)
 
 # ==========================================================
 # USDA FUNCTIONS
 # ==========================================================
 
-@st.cache_data(ttl=86400)
+@st.cache_resource
+def get_session():
+    s = requests.Session()
+    s.headers.update({"X-Api-Key": USDA_API_KEY})
+    s.mount("https://", HTTPAdapter(
+        pool_connections=10, pool_maxsize=20,
+        max_retries=Retry(total=2, backoff_factor=0.2)
+    ))
+    return s
+
+# Food details are persisted to disk so they survive server restarts.
+# persist="disk" ignores ttl and never evicts, so each detail entry is
+# stamped and refetched once it is older than DETAILS_MAX_AGE. Searches
+# stay in memory: their free-text keys would grow the disk cache without
+# bound. Failed requests raise inside the cached functions and are never
+# stored.
+DETAILS_MAX_AGE=86400
+
+@st.cache_data(ttl=86400, max_entries=2000, show_spinner=False)
+def fetch_search(query):
+    r = get_session().get(
+        f"{BASE_URL}/foods/search",
+        params={"query":query,"pageSize":10},
+        timeout=20
+    )
+    r.raise_for_status()
+    return orjson.loads(r.content).get("foods",[])
+
 def search_food(query):
     try:
-        r = requests.get(
-            f"{BASE_URL}/foods/search",
-            params={"query":query,"api_key":USDA_API_KEY,"pageSize":10},
-            timeout=20
-        )
-        return r.json().get("foods",[]) if r.status_code==200 else []
+        return fetch_search(query)
     except:
         return []
 
-@st.cache_data(ttl=86400)
+def fetch_food_details(fdc_id):
+    # Only the tracked nutrients are requested; the full format is kept
+    # because the abridged one drops foodPortions
+    r = get_session().get(
+        f"{BASE_URL}/food/{fdc_id}",
+        params={"nutrients":list(NUM_TO_IDX)},
+        timeout=20
+    )
+    r.raise_for_status()
+    return orjson.loads(r.content)
+
+@st.cache_data(persist="disk", max_entries=2000, show_spinner=False)
+def fetch_food_details_cached(fdc_id):
+    return {"fetched_at":time.time(),"food":fetch_food_details(fdc_id)}
+
 def get_food_details(fdc_id):
     try:
-        r = requests.get(
-            f"{BASE_URL}/food/{fdc_id}",
-            params={"api_key":USDA_API_KEY},
-            timeout=20
-        )
-        return r.json() if r.status_code==200 else {}
+        entry=fetch_food_details_cached(fdc_id)
+        if time.time()-entry["fetched_at"]>DETAILS_MAX_AGE:
+            # Drop the stale payload and its parses, then fetch it again
+            fetch_food_details_cached.clear(fdc_id)
+            extract_nutrients_by_id.clear(fdc_id,None)
+            extract_portions_by_id.clear(fdc_id,None)
+            entry=fetch_food_details_cached(fdc_id)
+        return entry["food"]
     except:
         return {}
 
+def get_food_details_many(fdc_ids):
+    # Workers read through the per-fdcId cache, so only real misses reach
+    # USDA. They get this run's script context to use the st.cache_* helpers.
+    with ThreadPoolExecutor(max_workers=8,initializer=add_script_run_ctx,
+                            initargs=(None,get_script_run_ctx())) as ex:
+        return {i:d for i,d in zip(fdc_ids,ex.map(get_food_details,fdc_ids)) if d}
+
 def extract_nutrients(food):
-    nutrients={"sodium":0,"potassium":0,"phosphorus":0,
-               "carbs":0,"protein":0,"calories":0,"water":0}
-
-    for n in food.get("foodNutrients",[]):
-        if "nutrient" in n:
-            number=n["nutrient"].get("number")
-            val=float(n.get("amount") or 0)
-
-            if number=="307": nutrients["sodium"]=val
-            elif number=="306": nutrients["potassium"]=val
-            elif number=="305": nutrients["phosphorus"]=val
-            elif number=="205": nutrients["carbs"]=val
-            elif number=="203": nutrients["protein"]=val
-            elif number=="208": nutrients["calories"]=val
-            elif number=="255": nutrients["water"]=val
+    nutrients=np.zeros(len(NUTRIENTS))
+    seen=set()
+
+    for n in food.get("foodNutrients",()):
+        # Full entries nest the number under "nutrient"; abridged ones don't
+        idx=NUM_TO_IDX.get((n.get("nutrient") or n).get("number"))
+        if idx is not None:
+            nutrients[idx]=float(n.get("amount") or 0)
+            seen.add(idx)
+            # Stop walking the (often 50+ entry) list once every target is set
+            if len(seen)==len(NUM_TO_IDX):
+                break
 
     return nutrients
 
 def extract_portions(food):
-    portions=[{"desc":"100 g","grams":100}]
+    # Keyed on (description, grams) so repeated USDA portions show once
+    portions={("100 g",100.0):{"desc":"100 g","grams":100}}
     if food.get("servingSize"):
-        portions.append({
-            "desc":f"1 serving ({food['servingSize']} g)",
-            "grams":float(food["servingSize"])
-        })
-    for p in food.get("foodPortions",[]):
-        if p.get("gramWeight") and p.get("portionDescription"):
-            portions.append({
-                "desc":p["portionDescription"],
-                "grams":float(p["gramWeight"])
-            })
-    return portions
+        desc=f"1 serving ({food['servingSize']} g)"
+        grams=float(food["servingSize"])
+        portions.setdefault((desc,round(grams,2)),{"desc":desc,"grams":grams})
+    for p in food.get("foodPortions",()):
+        desc=p.get("portionDescription")
+        if p.get("gramWeight") and desc:
+            grams=float(p["gramWeight"])
+            portions.setdefault((desc,round(grams,2)),{"desc":desc,"grams":grams})
+    return list(portions.values())
+
+# Parsed once per food; the underscored detail payload is not hashed
+@st.cache_data(ttl=86400, max_entries=512)
+def extract_nutrients_by_id(fdc_id,_food):
+    return extract_nutrients(_food)
+
+@st.cache_data(ttl=86400, max_entries=512)
+def extract_portions_by_id(fdc_id,_food):
+    return extract_portions(_food)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_range(patient, since):
+    return pd.read_sql_query(SQL_LOAD_RANGE,get_conn(),params=(patient,since),
+                             parse_dates=["log_date"],dtype_backend="pyarrow")
 
 def scale(base,grams):
-    factor=grams/100
-    return {k:round(v*factor,2) for k,v in base.items()}
+    return base*(grams*0.01)
+
+def risk_label(p):
+    idx=int(p>RISK_LOW)+int(p>RISK_MODERATE)
+    return RISK_LABELS[idx],RISK_ICONS[idx]
 
 # ==========================================================
 # PATIENT PROFILE
@@ -115,12 +229,15 @@ def scale(base,grams):
 
 st.sidebar.header("Patient Profile")
 
-patient=st.sidebar.text_input("Patient Name","Patient A")
-stage=st.sidebar.selectbox("CKD Stage",[1,2,3,4,5])
-weight=st.sidebar.number_input("Body Weight (kg)",70.0)
-hba1c=st.sidebar.number_input("HbA1c (%)",6.5)
-fasting_glucose=st.sidebar.number_input("Fasting Glucose",100)
-daily_water_limit=st.sidebar.number_input("Daily Water Limit (ml)",2000.0)
+# Profile edits are applied together on submit instead of one rerun per field
+with st.sidebar.form("profile"):
+    patient=st.text_input("Patient Name","Patient A")
+    stage=st.selectbox("CKD Stage",[1,2,3,4,5])
+    weight=st.number_input("Body Weight (kg)",70.0)
+    hba1c=st.number_input("HbA1c (%)",6.5)
+    fasting_glucose=st.number_input("Fasting Glucose",100)
+    daily_water_limit=st.number_input("Daily Water Limit (ml)",2000.0)
+    st.form_submit_button("Apply")
 
 # Calorie estimate
 calorie_limit = weight * 30
@@ -137,24 +254,24 @@ else:
     carb_limit = 150
 
 limits={
-    1:{"sodium":2300,"potassium":3500,"phosphorus":1000},
-    2:{"sodium":2300,"potassium":3500,"phosphorus":1000},
-    3:{"sodium":2000,"potassium":2500,"phosphorus":900},
-    4:{"sodium":2000,"potassium":2000,"phosphorus":800},
-    5:{"sodium":2000,"potassium":1500,"phosphorus":700},
-}[stage]
-
-limits["carbs"]=carb_limit
-limits["protein"]=protein_limit
-limits["calories"]=calorie_limit
-limits["water"]=daily_water_limit
+    **dict(zip(CKD_NUTRIENTS,STAGE_LIMITS[stage-1])),
+    "carbs":carb_limit,
+    "protein":protein_limit,
+    "calories":calorie_limit,
+    "water":daily_water_limit,
+}
 
 # ==========================================================
 # SESSION STATE
 # ==========================================================
 
-if "meals" not in st.session_state:
-    st.session_state.meals={m:[] for m in MEALS}
+# Items per meal section, keyed by item id (insertion-ordered)
+meals=st.session_state.setdefault("meals",{m:{} for m in MEALS})
+
+def next_item_id():
+    # Keys only need to be unique within the session
+    st.session_state["next_id"]=st.session_state.get("next_id",0)+1
+    return st.session_state["next_id"]
 
 # ==========================================================
 # MEAL BUILDER
@@ -163,73 +280,123 @@ if "meals" not in st.session_state:
 st.title("Renal + Diabetes Clinical Platform")
 
 meal_choice=st.selectbox("Meal Section",MEALS)
-query=st.text_input("Search Food")
-
-if st.button("Search"):
-    st.session_state.results=search_food(query)
 
-if "results" in st.session_state and st.session_state.results:
-    selected=st.selectbox("Select Food",
-                          st.session_state.results,
-                          format_func=lambda x:x["description"])
-
-    food=get_food_details(selected["fdcId"])
-    base=extract_nutrients(food)
-    portions=extract_portions(food)
-
-    portion=st.selectbox("Select Portion",portions,
-                         format_func=lambda x:x["desc"])
-
-    qty=st.number_input("How many portions?",1.0,step=0.5)
-
-    if st.button("Add Food"):
-        grams=portion["grams"]*qty
-        st.session_state.meals[meal_choice].append({
-            "id":str(uuid.uuid4()),
-            "name":selected["description"],
-            "grams":grams,
-            "base":base
-        })
-        st.rerun()
+# Search/select/portion widgets rerun only this fragment; adding a food
+# triggers a full rerun so totals, risk and logs pick it up
+@st.fragment
+def meal_builder(meal_choice):
+    query=st.text_input("Search Food")
+
+    if st.button("Search"):
+        # Normalised so "Banana " and "banana" share one cached USDA lookup
+        q=query.strip().lower()
+        if not q:
+            st.warning("Enter a food to search for.")
+        else:
+            # Search is also the retry for details that failed to load
+            st.session_state.failed_ids=set()
+            if q!=st.session_state.get("last_query") or not st.session_state.get("results"):
+                st.session_state.results=search_food(q)
+                st.session_state.last_query=q
+
+    results=st.session_state.get("results")
+
+    if results:
+        # Prefetch details for every result so switching foods is instant.
+        # Failed ids wait for the next Search instead of blocking each rerun.
+        failed=st.session_state.setdefault("failed_ids",set())
+        details=get_food_details_many(tuple(r["fdcId"] for r in results if r["fdcId"] not in failed))
+        failed.update(r["fdcId"] for r in results if r["fdcId"] not in details)
+
+        selected=st.selectbox("Select Food",
+                              results,
+                              format_func=lambda x:x["description"])
+
+        food=details.get(selected["fdcId"],{})
+        # A failed fetch must not be parsed (or cached) as zero nutrients
+        if not food:
+            st.warning("Nutrient details for this food could not be loaded. Search again to retry.")
+            return
+        base=extract_nutrients_by_id(selected["fdcId"],food)
+        portions=extract_portions_by_id(selected["fdcId"],food)
+
+        portion=st.selectbox("Select Portion",portions,
+                             format_func=lambda x:x["desc"])
+
+        qty=st.number_input("How many portions?",1.0,step=0.5)
+
+        if st.button("Add Food"):
+            grams=portion["grams"]*qty
+            item_id=next_item_id()
+            meals[meal_choice][item_id]={
+                "id":item_id,
+                "name":selected["description"],
+                "grams":grams,
+                "base":base
+            }
+            st.rerun()
+
+meal_builder(meal_choice)
 
 # ==========================================================
 # CALCULATE TOTALS
 # ==========================================================
 
-daily={k:0 for k in ["sodium","potassium","phosphorus",
-                     "carbs","protein","calories","water"]}
-
-meal_totals={m:{k:0 for k in daily} for m in MEALS}
-
-for meal in MEALS:
-    st.subheader(meal)
-    for item in st.session_state.meals[meal]:
-
-        col1,col2,col3=st.columns([4,2,1])
-        with col1: st.write(item["name"])
-        with col2:
-            item["grams"]=st.number_input("grams",
-                                          item["grams"],
-                                          key=item["id"])
-        with col3:
-            if st.button("Remove",key="r"+item["id"]):
-                st.session_state.meals[meal]=[
-                    i for i in st.session_state.meals[meal]
-                    if i["id"]!=item["id"]
-                ]
-                st.rerun()
-
-        scaled=scale(item["base"],item["grams"])
-        for k in daily:
-            daily[k]+=scaled[k]
-            meal_totals[meal][k]+=scaled[k]
+# One editable table per meal; gram edits and removals are applied together
+# on submit. The editor key follows the meal's item ids so stored row edits
+# never carry over onto different items after an add or remove.
+edited={}
+
+with st.form("meals_edit"):
+    for meal in MEALS:
+        st.subheader(meal)
+        items=meals[meal]
+        if items:
+            edited[meal]=st.data_editor(
+                pd.DataFrame({
+                    "Food":[i["name"] for i in items.values()],
+                    "Grams":[i["grams"] for i in items.values()],
+                    "Remove":False,
+                },index=list(items)),
+                column_config={
+                    "Grams":st.column_config.NumberColumn(min_value=0.0,required=True),
+                },
+                disabled=["Food"],
+                hide_index=True,
+                key=f"edit_{meal}_{hash(tuple(items))}",
+            )
+    st.form_submit_button("Update Meals")
+
+removed=False
+for meal,df in edited.items():
+    for item_id,grams,remove in zip(df.index,df["Grams"],df["Remove"]):
+        if remove:
+            del meals[meal][item_id]
+            removed=True
+        else:
+            meals[meal][item_id]["grams"]=float(grams)
+
+if removed:
+    st.rerun()
+
+# Daily nutrient totals in NUTRIENTS order, scaled and summed for all
+# items at once
+daily_arr=np.zeros(len(NUTRIENTS))
+
+items=[i for meal in MEALS for i in meals[meal].values()]
+if items:
+    grams=np.fromiter((i["grams"] for i in items),dtype=np.float64,count=len(items))
+    scaled=scale(np.stack([i["base"] for i in items]),grams[:,None])
+    daily_arr=scaled.sum(axis=0)
 
 # ==========================================================
 # ADDITIONAL WATER
 # ==========================================================
 
 extra_water=st.number_input("Additional Water Consumed (ml)",0.0)
-daily["water"]+=extra_water
+daily_arr[NUTRIENTS.index("water")]+=extra_water
+
+daily=dict(zip(NUTRIENTS,daily_arr.tolist()))
 
 # ==========================================================
 # DAILY + PER MEAL LIMIT DISPLAY
@@ -237,39 +404,33 @@ daily["water"]+=extra_water
 
 st.header("Daily & Per-Meal Recommendations")
 
-for n in ["sodium","potassium","phosphorus",
-          "carbs","protein","calories","water"]:
+limit_arr=np.array([limits[n] for n in NUTRIENTS],dtype=np.float64)
+meal_limit_arr=limit_arr*MEAL_SPLIT[meal_choice]
 
-    daily_limit=limits[n]
-    meal_limit=daily_limit*MEAL_SPLIT[meal_choice]
-    consumed=daily[n]
+# A zero limit (e.g. water limit set to 0) shows 0% rather than dividing by zero
+daily_pct=np.divide(daily_arr*100,limit_arr,
+                    out=np.zeros_like(daily_arr),where=limit_arr!=0)
+meal_pct=np.divide(daily_arr*100,meal_limit_arr,
+                   out=np.zeros_like(daily_arr),where=meal_limit_arr!=0)
 
-    daily_pct=(consumed/daily_limit)*100 if daily_limit else 0
-    meal_pct=(consumed/meal_limit)*100 if meal_limit else 0
-
-    st.write(
-        f"{n.capitalize()} → {round(consumed,1)} | "
-        f"Daily: {round(daily_limit,1)} ({round(daily_pct,1)}%) | "
-        f"{meal_choice}: {round(meal_limit,1)} ({round(meal_pct,1)}%)"
-    )
+st.dataframe(pd.DataFrame({
+    "Nutrient":[n.capitalize() for n in NUTRIENTS],
+    "Consumed":daily_arr.round(1),
+    "Daily Limit":limit_arr.round(1),
+    "Daily %":daily_pct.round(1),
+    f"{meal_choice} Limit":meal_limit_arr.round(1),
+    f"{meal_choice} %":meal_pct.round(1),
+}),hide_index=True)
 
 # ==========================================================
 # RISK ENGINE WITH CONTRIBUTORS
 # ==========================================================
 
-def risk_label(p):
-    if p<=40: return "Low","🟢"
-    elif p<=70: return "Moderate","🟡"
-    return "High","🔴"
-
-ckd_components={
-    "Sodium":(daily["sodium"]/limits["sodium"])*100,
-    "Potassium":(daily["potassium"]/limits["potassium"])*100,
-    "Phosphorus":(daily["phosphorus"]/limits["phosphorus"])*100
-}
+# Percent-of-limit per CKD nutrient; NUTRIENTS starts with CKD_NUTRIENTS
+ckd_ratios=daily_arr[:len(CKD_NUTRIENTS)]*STAGE_INV_LIMITS[stage-1]
 
-ckd_score=max(ckd_components.values())
-ckd_driver=max(ckd_components,key=ckd_components.get)
+ckd_score=float(ckd_ratios.max())
+ckd_driver=CKD_LABELS[int(ckd_ratios.argmax())]
 
 dm_score=(daily["carbs"]/limits["carbs"])*100
 dm_driver="Carbohydrates"
@@ -279,13 +440,13 @@ combined=round((ckd_score*0.6)+(dm_score*0.4),1)
 st.header("Risk Dashboard")
 
 l1,i1=risk_label(ckd_score)
-st.subheader(f"CKD Risk: {i1} {l1} ({round(ckd_score,1)}%)")
+st.subheader(f"CKD Risk: {i1} {l1} ({ckd_score:.1f}%)")
 st.write("Contributors:")
-for k,v in sorted(ckd_components.items(),key=lambda x:x[1],reverse=True):
-    st.write(f"• {k}: {round(v,1)}% of limit")
+for i in np.argsort(-ckd_ratios,kind="stable"):
+    st.write(f"• {CKD_LABELS[i]}: {ckd_ratios[i]:.1f}% of limit")
 
 l2,i2=risk_label(dm_score)
-st.subheader(f"Diabetes Risk: {i2} {l2} ({round(dm_score,1)}%)")
+st.subheader(f"Diabetes Risk: {i2} {l2} ({dm_score:.1f}%)")
 st.write(f"Contributor: {dm_driver}")
 
 l3,i3=risk_label(combined)
@@ -298,36 +459,38 @@ st.write(f"Primary Driver: {ckd_driver if ckd_score>dm_score else dm_driver}")
 
 today=str(date.today())
 
-c.execute("""
-INSERT OR REPLACE INTO logs
-VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-""",(
+row=(
     patient,today,
     daily["sodium"],daily["potassium"],daily["phosphorus"],
     daily["carbs"],daily["protein"],daily["calories"],
     daily["water"],ckd_score,dm_score,combined
-))
-conn.commit()
+)
+
+# Only write when the totals actually changed since the last rerun
+if st.session_state.get("last_written")!=row:
+    with conn:
+        conn.execute(SQL_UPSERT_LOG,row)
+    load_range.clear()
+    st.session_state["last_written"]=row
 
 # ==========================================================
 # WEEKLY & MONTHLY LOGS
 # ==========================================================
 
-st.header("Weekly Log")
 week=str(date.today()-timedelta(days=7))
-df_week=pd.read_sql_query(
-    "SELECT * FROM logs WHERE patient=? AND log_date>=?",
-    conn,params=(patient,week))
+month=str(date.today()-timedelta(days=30))
+
+# One read for the 30-day window; the weekly view is sliced from it
+df_month=load_range(patient,month)
+df_week=df_month[df_month["log_date"]>=pd.Timestamp(week)]
+
+st.header("Weekly Log")
 if not df_week.empty:
-    st.line_chart(df_week.set_index("log_date")[["ckd_risk","dm_risk","combined_risk"]])
+    st.line_chart(df_week,x="log_date",y=RISK_COLUMNS)
 
 st.header("Monthly Log")
-month=str(date.today()-timedelta(days=30))
-df_month=pd.read_sql_query(
-    "SELECT * FROM logs WHERE patient=? AND log_date>=?",
-    conn,params=(patient,month))
 if not df_month.empty:
-    st.line_chart(df_month.set_index("log_date")[["ckd_risk","dm_risk","combined_risk"]])
+    st.line_chart(df_month,x="log_date",y=RISK_COLUMNS)
 
 # ==========================================================
 # DISCLAIMER